@@ -1,10 +1,36 @@
+import atexit
+from array import array
+from collections import defaultdict
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
 import pandas as pd
 import sqlalchemy
-from cassandra.cluster import Cluster
-from cassandra.query import SimpleStatement, BoundStatement, PreparedStatement
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import DCAwareRoundRobinPolicy, HostDistance, TokenAwarePolicy
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.query import SimpleStatement, BoundStatement, PreparedStatement, BatchStatement, BatchType
+import statistics
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import time
 from colorama import Fore, Style, init
-from numpy import nan
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # Inicializar colorama
 init(autoreset=True)
@@ -16,273 +42,1485 @@ psql_usr = "postgres"
 psql_psw = "postgres"
 psql_host = "localhost"
 file = 'datasets/postings.csv'
+# Quantidade de linhas lidas do CSV por vez; None lê o arquivo inteiro de uma só vez
+csv_chunksize = 100_000
+# Colunas lidas do CSV; None lê todas as colunas do esquema (as demais ficam vazias nos bancos)
+csv_columns = None
+# Colunas de baixa cardinalidade lidas do CSV como categóricas
+csv_categorical_columns = ["pay_period", "formatted_work_type", "application_type",
+                           "formatted_experience_level", "work_type", "currency", "compensation_type"]
+# Guardar textos com o tipo string do pyarrow (mais compacto que objetos Python; requer pyarrow)
+csv_pyarrow_strings = False
+# Cache do CSV já convertido em Parquet, gravado ao lado do CSV (requer pyarrow) e refeito quando o CSV muda
+csv_cache_enabled = True
+# Quando o tamanho é o mesmo mas a data de modificação mudou, comparar o hash SHA-256 do CSV antes de descartar o cache
+csv_cache_hash = True
+# Ler o cache por mapeamento em memória
+csv_cache_memory_map = True
+# Versão do formato do cache; caches gravados com outra versão (outra conversão dos dados) são refeitos
+csv_cache_format = 2
 
-try:
-    print(Fore.YELLOW + f"Lendo arquivo {file}")
-    job_postings = pd.read_csv(file)
-    print(Fore.LIGHTGREEN_EX +
-          f"{len(job_postings)} linhas lidas com sucesso!")
-except Exception as e:
-    print(Fore.RED + "Falha ao ler o arquivo CSV: " + str(e))
-    exit()
+# Execuções de cada consulta: aquecimento (descartadas) e medidas
+benchmark_warmup = 1
+benchmark_runs = 3
+# Preparar as consultas uma vez por sessão (Cassandra) ou por conexão (PostgreSQL, apenas consultas com
+# parâmetros "?") e reutilizá-las, para que as execuções repetidas não meçam a análise e o planejamento
+prepared_statements_enabled = True
+
+# Teste de carga: executar as consultas a partir de vários clientes simultâneos durante um tempo fixo
+load_test_enabled = False
+# Quantidade de clientes (threads) simultâneos em cada rodada do teste de carga
+load_test_concurrency_levels = [1, 4, 16, 64]
+# Duração de cada rodada do teste de carga, em segundos
+load_test_duration = 10
+
+# Amostragem de CPU, memória e E/S do cliente e dos servidores durante cada fase (requer psutil)
+resource_sampling_enabled = True
+# Intervalo entre amostras, em segundos
+resource_sample_interval = 0.1
+# Padrões procurados no nome/linha de comando dos processos locais de cada servidor
+resource_server_processes = {
+    "postgres": ["postgres", "postmaster"],
+    "cassandra": ["CassandraDaemon"],
+}
+
+# Varredura de escala: importar e consultar o dataset com cada quantidade de linhas (lista vazia desativa)
+scale_sweep_sizes = []  # Ex: [100, 1000, 10000, 100000]
+# Diretório onde os gráficos e o arquivo de resultados da varredura são gravados
+results_dir = "logs"
+
+# Modo de carga do PostgreSQL: "direct" (COPY na tabela final, já com chave primária e índices) ou "staging"
+# (COPY numa tabela UNLOGGED sem índices, que recebe a chave primária e os índices depois e é trocada
+# atomicamente pela tabela final)
+postgres_load_mode = "staging"
+# No modo "staging", converter a tabela para LOGGED antes da troca (reescreve a tabela no WAL; o tempo entra
+# no de criação dos índices). Com False a tabela final continua UNLOGGED: as consultas e atualizações medidas
+# depois deixam de gravar WAL e a tabela é esvaziada pelo PostgreSQL após uma queda do servidor
+postgres_staging_set_logged = True
+# Colunas com índice secundário no PostgreSQL
+postgres_secondary_indexes = ["formatted_work_type"]
+# Ler os resultados das consultas por um cursor no servidor, em lotes de postgres_fetch_size linhas que são
+# contados e descartados (memória do cliente limitada a um lote); False usa fetchall()
+postgres_stream_results = True
+postgres_fetch_size = 10_000
 
 # Configuração do PostgreSQL
-postgres_conn_str = f"postgresql://{psql_usr}:{psql_psw}@{psql_host}/{database}"
-postgresql_engine = sqlalchemy.create_engine(postgres_conn_str)
+postgres_conn_str = f"postgresql+psycopg2://{psql_usr}:{psql_psw}@{psql_host}/{database}"
+# O pool precisa de uma conexão por cliente do teste de carga
+postgresql_engine = sqlalchemy.create_engine(
+    postgres_conn_str, pool_size=max(load_test_concurrency_levels))
 
 # Configurações do Cassandra
 cassandra_container_ip = "172.20.0.2"  # Substitua pelo IP real do container
 keyspace = database
+# Roteamento: enviar cada requisição direto a uma réplica da partição (token-aware) dentro do datacenter local
+cassandra_token_aware = True
+cassandra_local_dc = None  # None usa o datacenter do primeiro nó contatado
+# Versão do protocolo nativo; None negocia a maior versão suportada pelo servidor
+cassandra_protocol_version = None
+# Compressão do protocolo: True (a disponível, preferindo LZ4 à Snappy), "lz4" (requer o pacote lz4),
+# "snappy" (requer python-snappy) ou False
+cassandra_compression = True
+# Conexões por nó; só pode ser alterado com cassandra_protocol_version 1 ou 2 (a partir da 3 o driver multiplexa
+# uma conexão e recusa a configuração), e o Cassandra 3.0+ já não aceita essas versões
+cassandra_connections_per_host = None
+# Tempo limite de cada requisição e da conexão, em segundos
+cassandra_request_timeout = 30.0
+cassandra_connect_timeout = 10.0
+# Modo de inserção no Cassandra: "concurrent" (várias requisições em andamento) ou "sequential" (um execute por linha)
+cassandra_insert_mode = "concurrent"
+# Número máximo de requisições de inserção em andamento ao mesmo tempo no modo "concurrent"
+cassandra_concurrency = 100
+# Linhas por UNLOGGED BATCH nas tabelas de consulta, agrupando linhas da mesma partição; 0 desativa os lotes
+# Lotes grandes com a coluna description podem passar de batch_size_fail_threshold_in_kb (50 KB por padrão)
+cassandra_batch_size = 0
+# Processos usados na inserção no Cassandra, cada um com a sua própria sessão; 1 insere no próprio script
+cassandra_ingest_processes = 1
+# Ler os resultados das consultas página a página (a próxima página é pedida antes de a atual ser processada),
+# contando e descartando as linhas; False usa .all(), que acumula todas as páginas numa lista
+cassandra_stream_results = True
+# Linhas por página nas consultas do Cassandra
+cassandra_fetch_size = 5000
+# Varredura paralela: quantidade de faixas do anel de tokens, threads que as leem e linhas por página
+cassandra_scan_splits = 64
+cassandra_scan_workers = os.cpu_count() or 4
+cassandra_scan_fetch_size = 5000
+# Leitura usada pelo GROUP BY no cliente: "token_range" (varredura paralela) ou "paged" (uma consulta paginada)
+cassandra_group_by_scan = "token_range"
+
+# Índice invertido local para busca de texto, construído durante a importação
+text_index_enabled = True
+text_index_fields = ["title", "description", "skills_desc"]
+
+# Índices de texto do PostgreSQL (GIN sobre tsvector e trigramas do pg_trgm): as buscas de texto são medidas
+# sem índice e, com esta opção, repetidas após a construção dos índices
+postgres_text_indexes_enabled = True
+# Configuração do to_tsvector; "simple" casa palavras inteiras sem radicalização, como o índice invertido do
+# Cassandra ("english" também casaria "engineers" e "engineering", e as contagens deixariam de ser comparáveis)
+postgres_text_search_config = "simple"
+
+# Esquema da tabela job_postings, compartilhado pela conversão dos dados e pela criação das tabelas
+# Cada coluna é mapeada para o tipo Python usado na conversão
+job_postings_schema = {
+    "job_id": str,
+    "company_name": str,
+    "company_id": str,
+    "title": str,
+    "description": str,
+    "max_salary": float,
+    "med_salary": float,
+    "min_salary": float,
+    "pay_period": str,
+    "formatted_work_type": str,
+    "location": str,
+    "applies": int,
+    "original_listed_time": str,
+    "remote_allowed": bool,
+    "views": int,
+    "job_posting_url": str,
+    "application_url": str,
+    "application_type": str,
+    "expiry": str,
+    "closed_time": str,
+    "formatted_experience_level": str,
+    "skills_desc": str,
+    "listed_time": str,
+    "posting_domain": str,
+    "sponsored": bool,
+    "work_type": str,
+    "currency": str,
+    "compensation_type": str,
+}
+job_postings_key = "job_id"
+cql_types = {str: "text", float: "float", int: "int", bool: "boolean"}
+postgres_types = {str: "text", float: "real", int: "integer", bool: "boolean"}
+
+# Tabelas de consulta do Cassandra, com as mesmas colunas de job_postings e populadas na mesma importação
+# Cada tabela é mapeada para a sua coluna de partição; a chave primária é ((coluna de partição), job_id)
+cassandra_query_tables = {
+    f"{table}_by_work_type": "formatted_work_type",
+}
+
+# Tabela do Cassandra com agregados de salário (máximo, mínimo, soma e contagem) mantidos durante a importação
+salary_stats_table = f"{table}_salary_stats"
+salary_stats_column = "max_salary"
+# Escopos de agregação: "overall" agrega todas as linhas na chave "all", os demais agrupam pela coluna
+salary_stats_scopes = ["overall", "pay_period", "formatted_work_type"]
+# Ler o salário máximo da tabela de agregados em vez de calcular MAX sobre job_postings
+cassandra_use_salary_stats = True
 
 ###################################### Helper Functions ##################################################
 
+# Cluster e sessão do Cassandra compartilhados pela importação e pelas consultas, criados no primeiro uso
+_cassandra_cluster = None
+_cassandra_session = None
+_cassandra_lock = threading.Lock()
+
+
+def create_cassandra_cluster():
+    """
+    Build a Cluster with the configured load balancing, protocol version, compression, connections per host
+    and timeouts.
+    """
+    load_balancing_policy = DCAwareRoundRobinPolicy(local_dc=cassandra_local_dc or '')
+    if cassandra_token_aware:
+        load_balancing_policy = TokenAwarePolicy(load_balancing_policy)
+    profile = ExecutionProfile(load_balancing_policy=load_balancing_policy,
+                               request_timeout=cassandra_request_timeout)
+
+    options = {
+        "execution_profiles": {EXEC_PROFILE_DEFAULT: profile},
+        "compression": cassandra_compression,
+        "connect_timeout": cassandra_connect_timeout,
+    }
+    if cassandra_protocol_version is not None:
+        options["protocol_version"] = cassandra_protocol_version
+
+    cluster = Cluster([cassandra_container_ip], **options)
+    if cassandra_connections_per_host:
+        if cassandra_protocol_version in (1, 2):
+            cluster.set_core_connections_per_host(HostDistance.LOCAL, cassandra_connections_per_host)
+            cluster.set_max_connections_per_host(HostDistance.LOCAL, cassandra_connections_per_host)
+        else:
+            print(Fore.RED + "cassandra_connections_per_host ignorado: requer cassandra_protocol_version 1 ou 2")
+    return cluster
+
+
+def get_cassandra_session():
+    """
+    Return the shared Cassandra session, connecting to the cluster on first use.
+    """
+    global _cassandra_cluster, _cassandra_session
+    with _cassandra_lock:
+        if _cassandra_session is None:
+            _cassandra_cluster = create_cassandra_cluster()
+            _cassandra_session = _cassandra_cluster.connect()
+        return _cassandra_session
+
+
+def close_cassandra_session():
+    """
+    Shut down the shared Cassandra cluster, if connected. Safe to call more than once.
+    """
+    global _cassandra_cluster, _cassandra_session
+    with _cassandra_lock:
+        if _cassandra_cluster is not None:
+            _cassandra_cluster.shutdown()
+        _cassandra_cluster = None
+        _cassandra_session = None
+        _cassandra_prepared.clear()
+
+
+atexit.register(close_cassandra_session)
+
+# Cache de comandos preparados na sessão do Cassandra, por texto da consulta e tamanho de página
+_cassandra_prepared = {}
+
+
+def cassandra_prepare(session, query, fetch_size=cassandra_fetch_size):
+    """
+    Return the prepared statement for `query` (with ? placeholders) paging `fetch_size` rows, preparing it on
+    first use. The statement object is shared, so callers must not change its fetch_size.
+    """
+    key = (query, fetch_size)
+    statement = _cassandra_prepared.get(key)
+    if statement is None:
+        statement = session.prepare(query)
+        statement.fetch_size = fetch_size
+        # Threads que prepararam a mesma consulta ao mesmo tempo passam a usar o mesmo objeto
+        statement = _cassandra_prepared.setdefault(key, statement)
+    return statement
+
 # Função para medir o tempo de execução
 
 
 def measure_time(func):
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        end_time = time.time()
+        end_time = time.perf_counter()
         return result, end_time - start_time
     return wrapper
 
-# Função para converter valores para inserir no Cassandra
+# Funções para repetir uma medição e resumir os tempos obtidos
 
 
-def safe_convert(value, dtype):
+def summarize_timings(samples):
     """
-    Safely convert value to the specified dtype, handling NaN and empty values by returning None.
+    Return mean, median, p95, p99, min, max and standard deviation (in seconds) of a list of timings.
     """
-    if pd.isna(value) or value == '':
-        return None
-    try:
-        if dtype == int:
-            # Convert to float first to handle string numbers
-            return int(float(value))
-        elif dtype == float:
-            return float(value)
-        elif dtype == bool:
-            return bool(int(value))
-        elif dtype == str:
-            return str(value)
-    except ValueError:
-        return None
+    return {
+        "runs": len(samples),
+        "mean": statistics.fmean(samples),
+        "median": statistics.median(samples),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "min": min(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def benchmark(func, *args, runs=None, warmup=None):
+    """
+    Call a @measure_time decorated function `warmup` times without recording, then `runs` times.
+    Returns the result of the last run and the summary of the recorded timings; for streamed results the
+    summary also has the time to the first batch ("first_batch") and the latency of each batch ("batch").
+    """
+    runs = benchmark_runs if runs is None else runs
+    warmup = benchmark_warmup if warmup is None else warmup
+
+    for _ in range(warmup):
+        func(*args)
+
+    samples, first_batches, batches = [], [], []
+    for _ in range(max(runs, 1)):
+        result, elapsed = func(*args)
+        samples.append(elapsed)
+        if isinstance(result, StreamedResult) and result.batch_times:
+            first_batches.append(result.first_batch_time)
+            batches.extend(result.batch_times)
+
+    stats = summarize_timings(samples)
+    if first_batches:
+        stats["first_batch"] = summarize_timings(first_batches)
+        stats["batch"] = summarize_timings(batches)
+    return result, stats
+
+
+def format_timings(stats):
+    return (f"Média: {stats['mean']:.4f}s, Mediana: {stats['median']:.4f}s, "
+            f"p95: {stats['p95']:.4f}s, p99: {stats['p99']:.4f}s, "
+            f"Mín: {stats['min']:.4f}s, Máx: {stats['max']:.4f}s, "
+            f"Desvio padrão: {stats['stdev']:.4f}s ({stats['runs']} execuções)")
+
+
+def format_batches(stats):
+    return (f"Primeiro lote: {stats['first_batch']['median']:.4f}s (mediana), "
+            f"Latência por lote: mediana {stats['batch']['median']:.4f}s, p95 {stats['batch']['p95']:.4f}s, "
+            f"máx {stats['batch']['max']:.4f}s ({stats['batch']['runs']} lotes)")
+
+# Consumo de resultados em lotes, sem reter as linhas
+
+
+class StreamedResult:
+    """
+    Consume an iterable of row batches, keeping only the row count, the time until the first batch arrived
+    and the latency of every batch (measured from construction). len() is the row count, so it can be
+    reported like a list of rows.
+    """
+
+    def __init__(self, batches):
+        start_time = time.perf_counter()
+        self.rows = 0
+        self.batch_times = []
+        for batch in batches:
+            now = time.perf_counter()
+            self.batch_times.append(now - start_time)
+            self.rows += len(batch)
+            start_time = now
+
+    @property
+    def first_batch_time(self):
+        return self.batch_times[0] if self.batch_times else None
+
+    def __len__(self):
+        return self.rows
+
+# Amostragem de recursos (CPU, memória, E/S) em segundo plano
+
+
+class ResourceSampler:
+    """
+    Sample CPU, RSS and disk I/O of this process and of the local database server processes from a
+    background thread while active (`with sampler:`). Activations accumulate, so one sampler can cover a
+    phase split across many chunks. Network I/O is system-wide, since psutil has no per-process counters.
+    Does nothing when psutil is not installed or resource_sampling_enabled is False.
+    """
+
+    def __init__(self, interval=resource_sample_interval):
+        self.enabled = psutil is not None and resource_sampling_enabled
+        self.interval = interval
+        self.groups = ["client", *resource_server_processes]
+        self.samples = {group: [] for group in self.groups}
+        self.io = {group: [0, 0] for group in self.groups}
+        self.net = [0, 0]
+        self._processes = None
+        self._last_sample = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _find_processes(self):
+        processes = {group: [] for group in self.groups}
+        client = psutil.Process()
+        # Processos filhos (ex: processos de inserção no Cassandra) contam como cliente
+        processes["client"] = [client, *client.children(recursive=True)]
+        client_pids = {process.pid for process in processes["client"]}
+        for process in psutil.process_iter(["name", "cmdline"]):
+            if process.pid in client_pids:
+                continue
+            text = " ".join([process.info["name"] or "", *(process.info["cmdline"] or [])])
+            for group, patterns in resource_server_processes.items():
+                if any(pattern in text for pattern in patterns):
+                    processes[group].append(process)
+                    break
+        return processes
+
+    def _add_children(self):
+        # multiprocessing.active_children() não percorre todos os processos, então os processos de inserção
+        # criados depois da primeira ativação também entram no grupo do cliente
+        known = {process.pid for process in self._processes["client"]}
+        for child in multiprocessing.active_children():
+            if child.pid not in known:
+                try:
+                    self._processes["client"].append(psutil.Process(child.pid))
+                except psutil.Error:
+                    pass
+
+    def _io_counters(self):
+        counters = {}
+        for group, processes in self._processes.items():
+            read = write = 0
+            for process in processes:
+                try:
+                    io_counters = process.io_counters()
+                    read += io_counters.read_bytes
+                    write += io_counters.write_bytes
+                except (psutil.Error, AttributeError):
+                    # Processos de outro usuário ou plataformas sem io_counters (macOS)
+                    pass
+            counters[group] = (read, write)
+        return counters
+
+    def _sample(self):
+        for group, processes in self._processes.items():
+            cpu = rss = 0.0
+            for process in processes:
+                try:
+                    cpu += process.cpu_percent(None)
+                    rss += process.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.samples[group].append((cpu, rss))
+        self._last_sample = time.perf_counter()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        # Os processos são procurados só na primeira ativação: percorrer todos os processos do sistema a
+        # cada bloco somaria esse custo aos tempos medidos
+        if self._processes is None:
+            self._processes = self._find_processes()
+        self._add_children()
+        for processes in self._processes.values():
+            for process in processes:
+                try:
+                    # A primeira chamada só inicia a contagem de CPU do processo
+                    process.cpu_percent(None)
+                except psutil.Error:
+                    pass
+        self._last_sample = time.perf_counter()
+        self._io_start = self._io_counters()
+        self._net_start = psutil.net_io_counters()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.enabled:
+            return False
+        self._stop.set()
+        self._thread.join()
+        # Amostra final, exceto quando a última foi há menos de um intervalo (cpu_percent sobre poucos
+        # microssegundos não tem significado)
+        if time.perf_counter() - self._last_sample >= self.interval:
+            self._sample()
+
+        for group, (read, write) in self._io_counters().items():
+            start_read, start_write = self._io_start[group]
+            self.io[group][0] += max(read - start_read, 0)
+            self.io[group][1] += max(write - start_write, 0)
+        net_end = psutil.net_io_counters()
+        self.net[0] += net_end.bytes_sent - self._net_start.bytes_sent
+        self.net[1] += net_end.bytes_recv - self._net_start.bytes_recv
+        return False
+
+    def summary(self):
+        """
+        Return average/peak CPU (%) and RSS (MB) and disk read/write (MB) per process group, plus
+        system network sent/received (MB), or None when sampling is disabled.
+        """
+        if not self.enabled:
+            return None
+        mb = 1024 * 1024
+        summary = {}
+        for group, samples in self.samples.items():
+            cpu = [sample[0] for sample in samples] or [0.0]
+            rss = [sample[1] / mb for sample in samples] or [0.0]
+            summary[group] = {
+                "cpu_avg": statistics.fmean(cpu),
+                "cpu_peak": max(cpu),
+                "rss_avg_mb": statistics.fmean(rss),
+                "rss_peak_mb": max(rss),
+                "read_mb": self.io[group][0] / mb,
+                "write_mb": self.io[group][1] / mb,
+            }
+        summary["net_sent_mb"] = self.net[0] / mb
+        summary["net_recv_mb"] = self.net[1] / mb
+        return summary
+
+
+def format_resources(summary):
+    names = {"client": "Cliente", "postgres": "PostgreSQL", "cassandra": "Cassandra"}
+    parts = [
+        f"{names.get(group, group)}: CPU {summary[group]['cpu_avg']:.1f}% (pico {summary[group]['cpu_peak']:.1f}%), "
+        f"RSS {summary[group]['rss_avg_mb']:.1f} MB (pico {summary[group]['rss_peak_mb']:.1f} MB), "
+        f"Disco L/E {summary[group]['read_mb']:.1f}/{summary[group]['write_mb']:.1f} MB"
+        for group in ["client", *resource_server_processes]
+    ]
+    parts.append(
+        f"Rede env/rec {summary['net_sent_mb']:.1f}/{summary['net_recv_mb']:.1f} MB")
+    return "Recursos - " + " | ".join(parts)
+
+# Funções para converter as colunas do DataFrame para os tipos do esquema
+
+
+def string_dtype():
+    return pd.StringDtype("pyarrow") if csv_pyarrow_strings and pa is not None else pd.StringDtype()
+
+
+def csv_dtypes(columns):
+    """
+    dtypes passed to read_csv for `columns`: category for csv_categorical_columns and text for every other
+    column. Numeric columns are also read as text and coerced by convert_column, so a malformed cell becomes
+    NA instead of failing the whole chunk.
+    """
+    return {name: "category" if name in csv_categorical_columns else string_dtype() for name in columns}
+
+
+integral_float_text = re.compile(r"-?\d+(\.0*)?")
+
+
+def strip_integral_floats(column):
+    """
+    Drop the ".0" of a text column whose values are all integers written as floats, as pandas saves ids and
+    timestamps that have missing values (e.g. company_id "1009.0", listed_time "1713397508000.0").
+    """
+    values = column.dropna()
+    # O primeiro valor já descarta colunas de texto comum sem percorrer a coluna inteira
+    if values.empty or not integral_float_text.fullmatch(values.iloc[0]):
+        return column
+    if not values.str.fullmatch(integral_float_text.pattern).all():
+        return column
+    return column.str.replace(r"\.0*$", "", regex=True)
+
+
+def convert_column(column, dtype):
+    """
+    Coerce a whole column to the nullable pandas dtype matching `dtype`, turning NaN, empty and invalid values into NA.
+    Categorical text columns stay categorical, with only their categories converted.
+    """
+    if dtype == str:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories = column.cat.categories
+            column = column.cat.remove_categories(categories[categories == ""])
+            return column.cat.rename_categories(column.cat.categories.astype(string_dtype()))
+        # Identificadores lidos como float (ex: company_id com valores ausentes) não devem virar "123.0"
+        if pd.api.types.is_float_dtype(column) and column.dropna().mod(1).eq(0).all():
+            column = column.astype("Int64")
+        return strip_integral_floats(column.astype(string_dtype()).replace("", pd.NA))
+
+    numeric = pd.to_numeric(column, errors="coerce")
+    if dtype == int:
+        values = np.trunc(numeric.to_numpy(dtype="float64", na_value=np.nan))
+        return pd.Series(values, index=column.index).astype("Int64")
+    elif dtype == float:
+        return numeric.astype("Float64")
+    elif dtype == bool:
+        return (numeric != 0).astype("boolean").mask(numeric.isna())
+
+
+def schema_column(df, name):
+    """
+    Column `name` of `df` (all NA when missing), as category when it is one of csv_categorical_columns.
+    """
+    column = df[name] if name in df else pd.Series(index=df.index, dtype=object)
+    return column.astype("category") if name in csv_categorical_columns else column
+
+
+def convert_job_postings(df):
+    """
+    Convert every column of the schema at once, returning a new frame with nullable dtypes.
+    Columns missing from `df` are filled with NA.
+    """
+    return pd.DataFrame({
+        name: convert_column(schema_column(df, name), dtype)
+        for name, dtype in job_postings_schema.items()
+    })
+
+
+def complete_job_postings(df):
+    """
+    Add the schema columns missing from an already converted frame (e.g. a projected read) as NA, in schema order.
+    Categorical columns read back from Parquet get their categories converted again.
+    """
+    return pd.DataFrame({
+        name: df[name] if name in df and name not in csv_categorical_columns
+        else convert_column(schema_column(df, name), dtype)
+        for name, dtype in job_postings_schema.items()
+    })
+
+
+def job_postings_rows(df):
+    """
+    Yield ready-to-bind tuples, in schema order, from a frame returned by convert_job_postings, with NA as None.
+    """
+    columns = [df[name].to_numpy(dtype=object, na_value=None)
+               for name in job_postings_schema]
+    return zip(*columns)
+
+# Função para inserir linhas no Cassandra com várias requisições em andamento
+
+
+def cassandra_insert_concurrent(session, statement, parameters, concurrency=cassandra_concurrency):
+    """
+    Execute the prepared statement once per parameter list, keeping at most `concurrency` requests in flight.
+    Parameters are consumed lazily, so a generator keeps memory bounded. Returns the number of failed inserts.
+    """
+    results = execute_concurrent_with_args(
+        session, statement, parameters, concurrency=concurrency,
+        raise_on_first_error=False, results_generator=True)
+
+    failures = 0
+    for success, result in results:
+        if not success:
+            failures += 1
+            if failures == 1:
+                print(Fore.RED + f"Erro ao inserir linha no Cassandra: {result}")
+    return failures
+
+# Função para copiar um DataFrame para o PostgreSQL usando COPY FROM STDIN
+
+
+def postgres_copy(connection, df, table_name=table):
+    """
+    Stream `df` into `table_name` with COPY ... FROM STDIN (CSV format) through an in-memory buffer.
+    `connection` is a raw DBAPI (psycopg2) connection; committing is left to the caller.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
 
 
 ###################################### POSTGRESQL ##################################################
-try:
-    # Começar timer para conexão e inserção de dados no PostgreSQL
-    psql_insert_start_time = time.time()
+# Funções para criar a tabela e importar os dados no PostgreSQL
+
 
-    with postgresql_engine.connect() as postgres_conn:
-        # Importar dados para PostgreSQL
-        job_postings.to_sql(table, postgresql_engine,
-                            if_exists='replace', index=False)
+def postgres_load_table():
+    """
+    Name of the table the chunks are copied into for the current postgres_load_mode.
+    """
+    return f"{table}_staging" if postgres_load_mode == "staging" else table
 
-        # Calcular tempo decorrido
-        psql_insert_time = time.time() - psql_insert_start_time
 
-        print(
-            Fore.GREEN + f"Dados importados para o PostgreSQL com sucesso. Tempo decorrido: {psql_insert_time:.4f}s")
-except Exception as e:
-    print(Fore.RED + f"Erro ao importar dados para o PostgreSQL: {e}")
+def create_postgres_indexes(postgres_conn, table_name):
+    postgres_conn.execute(sqlalchemy.text(
+        f"ALTER TABLE {table_name} ADD CONSTRAINT {table_name}_pkey PRIMARY KEY ({job_postings_key})"))
+    for column in postgres_secondary_indexes:
+        postgres_conn.execute(sqlalchemy.text(
+            f"CREATE INDEX {table_name}_{column}_idx ON {table_name} ({column})"))
+
+
+def create_postgres_table():
+    """
+    (Re)create the empty PostgreSQL load table from the declared schema, with the same column types as the
+    Cassandra table. In "direct" mode it is the final table, created with its primary key and secondary
+    indexes; in "staging" mode it is an UNLOGGED table without any index.
+    """
+    load_table = postgres_load_table()
+    column_definitions = ",\n".join(
+        f"{name} {postgres_types[dtype]}" for name, dtype in job_postings_schema.items())
+    unlogged = "UNLOGGED " if postgres_load_mode == "staging" else ""
+
+    with postgresql_engine.begin() as postgres_conn:
+        postgres_conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {load_table}"))
+        if postgres_load_mode != "staging":
+            # No modo "staging" a tabela final só é substituída na troca, depois da carga
+            postgres_conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {table}"))
+        postgres_conn.execute(sqlalchemy.text(
+            f"CREATE {unlogged}TABLE {load_table} (\n{column_definitions}\n)"))
+        if postgres_load_mode != "staging":
+            create_postgres_indexes(postgres_conn, load_table)
+
+
+def load_postgres_chunk(df):
+    """
+    Copy one converted chunk into the PostgreSQL load table and commit it.
+    """
+    postgres_raw_conn = postgresql_engine.raw_connection()
+    try:
+        postgres_copy(postgres_raw_conn, df, postgres_load_table())
+        postgres_raw_conn.commit()
+    finally:
+        postgres_raw_conn.close()
+
+
+def finish_postgres_staging_load():
+    """
+    Build the primary key and secondary indexes on the loaded staging table, optionally make it LOGGED,
+    and atomically swap it in as the final table (renaming its indexes) in a single transaction.
+    Returns the index build time and the swap time, in seconds.
+    """
+    staging_table = postgres_load_table()
+
+    index_start_time = time.perf_counter()
+    with postgresql_engine.begin() as postgres_conn:
+        create_postgres_indexes(postgres_conn, staging_table)
+        if postgres_staging_set_logged:
+            postgres_conn.execute(sqlalchemy.text(f"ALTER TABLE {staging_table} SET LOGGED"))
+    index_time = time.perf_counter() - index_start_time
+
+    swap_start_time = time.perf_counter()
+    with postgresql_engine.begin() as postgres_conn:
+        postgres_conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {table}"))
+        postgres_conn.execute(sqlalchemy.text(f"ALTER TABLE {staging_table} RENAME TO {table}"))
+        postgres_conn.execute(sqlalchemy.text(
+            f"ALTER TABLE {table} RENAME CONSTRAINT {staging_table}_pkey TO {table}_pkey"))
+        for column in postgres_secondary_indexes:
+            postgres_conn.execute(sqlalchemy.text(
+                f"ALTER INDEX {staging_table}_{column}_idx RENAME TO {table}_{column}_idx"))
+    swap_time = time.perf_counter() - swap_start_time
+
+    return index_time, swap_time
+
+
+# Documento de texto indexado no PostgreSQL; as consultas @@ precisam usar a mesma expressão do índice GIN
+postgres_text_document = " || ' ' || ".join(
+    f"coalesce({field}, '')" for field in text_index_fields)
+postgres_text_vector = f"to_tsvector('{postgres_text_search_config}', {postgres_text_document})"
+
+
+def create_postgres_text_indexes():
+    """
+    Build the full-text GIN index and one pg_trgm GIN index per text field on the PostgreSQL table.
+    """
+    with postgresql_engine.begin() as postgres_conn:
+        postgres_conn.execute(sqlalchemy.text(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        postgres_conn.execute(sqlalchemy.text(
+            f"CREATE INDEX IF NOT EXISTS {table}_text_fts ON {table} USING GIN ({postgres_text_vector})"))
+        for field in text_index_fields:
+            postgres_conn.execute(sqlalchemy.text(
+                f"CREATE INDEX IF NOT EXISTS {table}_{field}_trgm ON {table} USING GIN ({field} gin_trgm_ops)"))
+        postgres_conn.execute(sqlalchemy.text(f"ANALYZE {table}"))
 
 ###################################### CASSANDRA ##################################################
-try:
-    # Começar timer para conexão e criação de tabela no Cassandra
-    cassandra_create_start_time = time.time()
+# Funções para criar o keyspace, a tabela e importar os dados no Cassandra
 
-    with Cluster([cassandra_container_ip]) as cassandra_cluster:
-        with cassandra_cluster.connect() as cassandra_session:
-            # Criar keyspace e tabela
-            cassandra_session.execute(f"DROP KEYSPACE IF EXISTS {keyspace}")
 
-            # Criar keyspace
-            cassandra_session.execute(f"""
-                CREATE KEYSPACE IF NOT EXISTS {keyspace}
-                WITH REPLICATION = {{ 'class' : 'SimpleStrategy', 'replication_factor' : 1 }}
-            """)
+def create_cassandra_schema():
+    """
+    (Re)create the keyspace, the main table and the query tables on the shared session.
+    Returns the prepared INSERT statement of each table, keyed by table name.
+    """
+    cassandra_session = get_cassandra_session()
 
-            # Usar o keyspace
-            cassandra_session.set_keyspace(keyspace)
+    # Criar keyspace e tabela
+    cassandra_session.execute(f"DROP KEYSPACE IF EXISTS {keyspace}")
+    _cassandra_prepared.clear()
+
+    # Criar keyspace
+    cassandra_session.execute(f"""
+        CREATE KEYSPACE IF NOT EXISTS {keyspace}
+        WITH REPLICATION = {{ 'class' : 'SimpleStrategy', 'replication_factor' : 1 }}
+    """)
+
+    # Usar o keyspace
+    cassandra_session.set_keyspace(keyspace)
+
+    # Criar tabelas a partir do esquema
+    column_definitions = ",\n".join(
+        f"{name} {cql_types[dtype]}" for name, dtype in job_postings_schema.items())
+    primary_keys = {table: job_postings_key}
+    for table_name, partition_key in cassandra_query_tables.items():
+        primary_keys[table_name] = f"({partition_key}), {job_postings_key}"
+
+    for table_name, primary_key in primary_keys.items():
+        cassandra_session.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} (\n{column_definitions},\nPRIMARY KEY ({primary_key})\n)")
+
+    return prepare_cassandra_inserts(cassandra_session)
+
+
+def prepare_cassandra_inserts(cassandra_session):
+    """
+    Prepare the INSERT statement of the main table and of every query table, keyed by table name.
+    """
+    prepared_statements = {}
+    for table_name in [table, *cassandra_query_tables]:
+        # Prepare the CQL statement
+        insert_statement = (
+            f"INSERT INTO {table_name} ({', '.join(job_postings_schema)}) "
+            f"VALUES ({', '.join('?' for _ in job_postings_schema)})")
+        prepared_statements[table_name] = cassandra_session.prepare(
+            insert_statement)
+    return prepared_statements
+
+
+def load_cassandra_chunk(prepared_statements, df):
+    """
+    Insert one converted chunk into every Cassandra table and return the number of failed rows.
+    Rows without a value for a query table's partition key are not written to that table.
+    """
+    cassandra_session = get_cassandra_session()
+
+    failures = 0
+    for table_name, prepared_statement in prepared_statements.items():
+        partition_key = cassandra_query_tables.get(table_name)
+        table_df = df if partition_key is None else df[df[partition_key].notna()]
+
+        if partition_key is not None and cassandra_batch_size > 0:
+            failures += cassandra_execute_batches(
+                cassandra_session, cassandra_partition_batches(
+                    prepared_statement, table_df, partition_key))
+            continue
+
+        rows = job_postings_rows(table_df)
+        if cassandra_insert_mode == "concurrent":
+            failures += cassandra_insert_concurrent(
+                cassandra_session, prepared_statement, rows)
+        else:
+            for values in rows:
+                cassandra_session.execute(prepared_statement, values)
+    return failures
+
+
+def cassandra_partition_batches(prepared_statement, df, partition_key, batch_size=None):
+    """
+    Yield UNLOGGED batches of at most `batch_size` rows of `df` that share the same `partition_key` value,
+    so every batch is written to a single partition.
+    """
+    batch_size = batch_size or cassandra_batch_size
+    for _, group in df.groupby(partition_key, sort=False, observed=True):
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for values in job_postings_rows(group):
+            batch.add(prepared_statement, values)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        if len(batch):
+            yield batch
+
+
+def cassandra_execute_batches(session, batches, concurrency=cassandra_concurrency):
+    """
+    Send the single-partition batches with at most `concurrency` in flight and return the number of rows
+    in failed batches.
+    """
+    sizes = []
+
+    def statements():
+        for batch in batches:
+            sizes.append(len(batch))
+            yield batch, None
+
+    results = execute_concurrent(
+        session, statements(), concurrency=concurrency,
+        raise_on_first_error=False, results_generator=True)
+
+    failures = 0
+    for index, (success, result) in enumerate(results):
+        if not success:
+            if not failures:
+                print(Fore.RED + f"Erro ao inserir lote no Cassandra: {result}")
+            failures += sizes[index]
+    return failures
+
+# Funções para distribuir a inserção no Cassandra entre vários processos
+
+# Instruções preparadas na sessão própria de cada processo de inserção
+_worker_statements = None
+
+
+def init_cassandra_ingest_worker(ready=None):
+    """
+    Process pool initializer: open this process's own Cassandra session and prepare the INSERT statements,
+    then wait on the `ready` barrier until every worker of the pool has done the same.
+    """
+    global _worker_statements
+    cassandra_session = get_cassandra_session()
+    cassandra_session.set_keyspace(keyspace)
+    _worker_statements = prepare_cassandra_inserts(cassandra_session)
+    if ready is not None:
+        ready.wait()
+
+
+def cassandra_ingest_worker_pid(_):
+    return os.getpid()
+
+
+def cassandra_ingest_shard(df):
+    """
+    Insert one shard from a worker process. Returns (pid, rows, seconds, failures).
+    """
+    start_time = time.perf_counter()
+    failures = load_cassandra_chunk(_worker_statements, df)
+    return os.getpid(), len(df), time.perf_counter() - start_time, failures
+
+
+def create_cassandra_ingest_pool(processes=cassandra_ingest_processes):
+    """
+    Start `processes` worker processes and return once all of them have imported the script, connected
+    and prepared their statements, so that startup cost is not counted in the insert time.
+    """
+    # "spawn" evita herdar as threads e conexões do driver do processo principal
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                   initializer=init_cassandra_ingest_worker,
+                                   initargs=(context.Barrier(processes),))
+    # O executor só cria os processos ao receber tarefas: uma tarefa por processo cria todos, e a barreira do
+    # inicializador faz as tarefas esperarem até que todos estejam conectados
+    list(executor.map(cassandra_ingest_worker_pid, range(processes)))
+    return executor
+
+
+def load_cassandra_chunk_parallel(executor, df, processes=cassandra_ingest_processes):
+    """
+    Split a converted chunk into `processes` contiguous row ranges and insert them in the worker pool.
+    Returns the (pid, rows, seconds, failures) result of each shard.
+    """
+    bounds = np.linspace(0, len(df), processes + 1, dtype=int)
+    shards = [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return list(executor.map(cassandra_ingest_shard, shards))
+
+# Funções para manter a tabela de agregados de salário no Cassandra
+
+
+def create_salary_stats_table():
+    """
+    Create the salary aggregates table on the shared session and return its prepared INSERT statement.
+    """
+    cassandra_session = get_cassandra_session()
+    cassandra_session.execute(f"""
+        CREATE TABLE IF NOT EXISTS {salary_stats_table} (
+            scope text,
+            group_key text,
+            max_value float,
+            min_value float,
+            sum_value double,
+            count bigint,
+            PRIMARY KEY ((scope), group_key)
+        )
+    """)
+    return cassandra_session.prepare(
+        f"INSERT INTO {salary_stats_table} (scope, group_key, max_value, min_value, sum_value, count) "
+        f"VALUES (?, ?, ?, ?, ?, ?)")
+
+
+def aggregate_salaries(df):
+    """
+    Compute max, min, sum and count of `salary_stats_column` for every (scope, group_key) of a converted chunk.
+    Groups without any salary value are left out.
+    """
+    values = pd.Series(df[salary_stats_column].to_numpy(
+        dtype="float64", na_value=np.nan), index=df.index)
+
+    aggregates = {}
+    for scope in salary_stats_scopes:
+        keys = pd.Series("all", index=df.index) if scope == "overall" else df[scope]
+        grouped = values.groupby(keys, dropna=True, observed=True).agg(
+            ["max", "min", "sum", "count"])
+        for group_key, row in grouped[grouped["count"] > 0].iterrows():
+            aggregates[(scope, str(group_key))] = (
+                row["max"], row["min"], row["sum"], int(row["count"]))
+    return aggregates
+
+
+def update_salary_stats(prepared_statement, totals, df):
+    """
+    Merge the aggregates of a converted chunk into `totals` and upsert the changed rows into Cassandra.
+    Returns the number of failed writes.
+    """
+    partial = aggregate_salaries(df)
+    for key, (max_value, min_value, sum_value, count) in partial.items():
+        if key in totals:
+            total = totals[key]
+            totals[key] = (max(total[0], max_value), min(total[1], min_value),
+                           total[2] + sum_value, total[3] + count)
+        else:
+            totals[key] = (max_value, min_value, sum_value, count)
+
+    return cassandra_insert_concurrent(
+        get_cassandra_session(), prepared_statement,
+        [(scope, group_key, *totals[(scope, group_key)]) for scope, group_key in partial])
+
+###################################### BUSCA DE TEXTO ##################################################
+# Índice invertido em memória para buscas de texto sem varrer o Cassandra (que não suporta LIKE '%termo%')
 
-            # Criar tabela
-            cassandra_session.execute(f"""
-                CREATE TABLE IF NOT EXISTS {table} (
-                    job_id text PRIMARY KEY,
-                    company_name text,
-                    company_id text,
-                    title text,
-                    description text,
-                    max_salary float,
-                    med_salary float,
-                    min_salary float,
-                    pay_period text,
-                    formatted_work_type text,
-                    location text,
-                    applies int,
-                    original_listed_time text,
-                    remote_allowed boolean,
-                    views int,
-                    job_posting_url text,
-                    application_url text,
-                    application_type text,
-                    expiry text,
-                    closed_time text,
-                    formatted_experience_level text,
-                    skills_desc text,
-                    listed_time text,
-                    posting_domain text,
-                    sponsored boolean,
-                    work_type text,
-                    currency text,
-                    compensation_type text
-                )
-            """)
+
+class InvertedIndex:
+    """
+    In-memory inverted index over `text_index_fields`, mapping each lowercase word to the ascending
+    array of internal document numbers containing it. Document numbers are translated back to
+    job_id, so matches can be fetched by primary key. Positions are not stored; phrase queries are
+    answered by intersecting the terms and verifying the phrase on the fetched rows.
+    """
+    token_pattern = re.compile(r"\w+")
+
+    def __init__(self, fields=text_index_fields):
+        self.fields = fields
+        self.job_ids = []
+        self.postings = defaultdict(lambda: array("I"))
+
+    @classmethod
+    def tokenize(cls, text):
+        return cls.token_pattern.findall(text.lower()) if text else []
+
+    def add_frame(self, df):
+        """
+        Index every row of a converted chunk.
+        """
+        job_ids = df[job_postings_key].to_numpy(dtype=object, na_value=None)
+        texts = [df[field].to_numpy(dtype=object, na_value=None)
+                 for field in self.fields]
+        for job_id, *values in zip(job_ids, *texts):
+            if job_id is None:
+                continue
+            document = len(self.job_ids)
+            self.job_ids.append(job_id)
+            terms = set()
+            for value in values:
+                terms.update(self.tokenize(value))
+            for term in terms:
+                self.postings[term].append(document)
+
+    def search(self, text):
+        """
+        Return the job_ids of the documents containing every word of `text`.
+        """
+        terms = set(self.tokenize(text))
+        if not terms or any(term not in self.postings for term in terms):
+            return []
+        lists = sorted((np.frombuffer(self.postings[term], dtype=np.uint32) for term in terms), key=len)
+        documents = lists[0]
+        for postings in lists[1:]:
+            documents = np.intersect1d(documents, postings, assume_unique=True)
+        return [self.job_ids[document] for document in documents]
+
+
+def postgres_word_pattern(text):
+    """
+    PostgreSQL regular expression (for ~*) matching the words of `text` as whole, consecutive words, the rule
+    InvertedIndex and contains_phrase apply on the Cassandra side.
+    """
+    return r"\m" + r"\W+".join(InvertedIndex.tokenize(text)) + r"\M"
+
+
+def postgres_word_filter(text):
+    return " OR ".join(f"{field} ~* '{postgres_word_pattern(text)}'" for field in text_index_fields)
+
+
+def contains_phrase(tokens, phrase):
+    size = len(phrase)
+    return any(tokens[index:index + size] == phrase for index in range(len(tokens) - size + 1))
+
+
+text_index = InvertedIndex()
+
+
+def cassandra_fetch_by_key(job_ids, table_name=table):
+    """
+    Fetch the rows of `job_ids` from Cassandra with concurrent primary key reads.
+    """
+    cassandra_session = get_cassandra_session()
+    statement = cassandra_prepare(
+        cassandra_session, f"SELECT * FROM {table_name} WHERE {job_postings_key} = ?")
+    results = execute_concurrent_with_args(
+        cassandra_session, statement, [(job_id,) for job_id in job_ids],
+        concurrency=cassandra_concurrency, raise_on_first_error=True)
+    return [row for _, result in results for row in result]
+
+
+def cassandra_text_search(text, phrase=False):
+    """
+    Rows of job_postings whose indexed fields contain every word of `text` (or, with `phrase`,
+    the words in sequence), resolved with the local inverted index and fetched by primary key.
+    """
+    rows = cassandra_fetch_by_key(text_index.search(text))
+    if phrase:
+        words = InvertedIndex.tokenize(text)
+        rows = [row for row in rows
+                if any(contains_phrase(InvertedIndex.tokenize(getattr(row, field)), words)
+                       for field in text_index.fields)]
+    return rows
+
+###################################### IMPORTAÇÃO ##################################################
+# Funções para ler o CSV em blocos e alimentar os dois bancos à medida que os blocos chegam
+
+
+def csv_cache_path(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def csv_cache_key(path, with_hash=False):
+    """
+    Describe the CSV (size, modification time, optionally SHA-256) and the schema the cache was converted with.
+    """
+    stat = os.stat(path)
+    key = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "format": csv_cache_format,
+        "schema": {name: dtype.__name__ for name, dtype in job_postings_schema.items()},
+        "categorical": csv_categorical_columns,
+    }
+    if with_hash:
+        key["sha256"] = file_sha256(path)
+    return key
+
+
+def csv_cache_is_fresh(path, cache_path):
+    """
+    Whether the Parquet cache was written from the current contents of the CSV with the current schema.
+    """
+    try:
+        cached = json.loads(pq.read_schema(cache_path).metadata[b"bigdata_source"])
+    except (OSError, KeyError, TypeError, ValueError):
+        return False
+
+    current = csv_cache_key(path)
+    if any(cached.get(field) != current[field] for field in ("size", "format", "schema", "categorical")):
+        return False
+    if cached["mtime"] == current["mtime"]:
+        return True
+    if not csv_cache_hash or cached.get("sha256") is None:
+        return False
+    current["sha256"] = file_sha256(path)
+    if cached["sha256"] != current["sha256"]:
+        return False
+
+    # Só a data mudou: gravar a nova data no cache para não calcular o hash do CSV em toda execução
+    try:
+        rewrite_csv_cache_key(cache_path, current)
+    except OSError as e:
+        print(Fore.RED + f"Erro ao atualizar o cache {cache_path}: {e}")
+    return True
+
+
+def rewrite_csv_cache_key(cache_path, key):
+    """
+    Rewrite the Parquet cache row group by row group with `key` as its source metadata.
+    """
+    temp_path = cache_path + ".tmp"
+    with pq.ParquetFile(cache_path, memory_map=csv_cache_memory_map) as parquet_file:
+        schema = parquet_file.schema_arrow
+        schema = schema.with_metadata({**schema.metadata, b"bigdata_source": json.dumps(key).encode()})
+        with pq.ParquetWriter(temp_path, schema) as writer:
+            for index in range(parquet_file.num_row_groups):
+                writer.write_table(parquet_file.read_row_group(index))
+    os.replace(temp_path, cache_path)
+
+
+def read_job_postings_cache(cache_path, chunksize=csv_chunksize, nrows=None, columns=None):
+    """
+    Iterate over the Parquet cache as converted DataFrames of at most `chunksize` rows, reading only `columns`
+    (all when None) from the file.
+    """
+    types = {pa.int64(): pd.Int64Dtype(), pa.float64(): pd.Float64Dtype(), pa.bool_(): pd.BooleanDtype(),
+             pa.string(): string_dtype(), pa.large_string(): string_dtype()}
+    parquet_file = pq.ParquetFile(cache_path, memory_map=csv_cache_memory_map)
+
+    if chunksize is None:
+        data = parquet_file.read(columns=columns)
+        data = data if nrows is None else data.slice(0, nrows)
+        yield complete_job_postings(data.to_pandas(types_mapper=types.get))
+        return
+
+    remaining = nrows
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        if remaining is not None:
+            batch = batch.slice(0, remaining)
+            remaining -= batch.num_rows
+        yield complete_job_postings(batch.to_pandas(types_mapper=types.get))
+        if remaining == 0:
+            return
+
+
+def csv_cache_schema(df):
+    """
+    Arrow schema of a converted chunk for the cache writer. The schema is fixed by the first chunk, so the
+    dictionary index of categorical columns is widened to int32 to fit the categories of later chunks.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(index, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+    return schema
+
+
+def read_job_postings(path, chunksize=csv_chunksize, nrows=None, columns=csv_columns):
+    """
+    Iterate over the dataset as converted DataFrames of at most `chunksize` rows (the whole file at once
+    when None), parsing only `columns` (all schema columns when None) with the declared dtypes; the other
+    schema columns are filled with NA. Reads the Parquet cache when it is fresh; otherwise parses the CSV
+    and, when the whole file is read, writes the converted chunks to a new cache as they go.
+    """
+    columns = list(job_postings_schema) if columns is None else [
+        job_postings_key, *(name for name in columns if name != job_postings_key)]
+    cache_path = csv_cache_path(path)
+    use_cache = csv_cache_enabled and pq is not None
+    if use_cache and csv_cache_is_fresh(path, cache_path):
+        print(Fore.YELLOW + f"Lendo cache {cache_path}")
+        yield from read_job_postings_cache(cache_path, chunksize, nrows, columns)
+        return
+
+    # Colunas do esquema ausentes no CSV são ignoradas aqui e preenchidas com NA na conversão
+    options = {"usecols": lambda name: name in columns,
+               "dtype": csv_dtypes(columns), "nrows": nrows}
+    if chunksize is None:
+        chunks = [pd.read_csv(path, **options)]
+    else:
+        chunks = pd.read_csv(path, chunksize=chunksize, **options)
+
+    # O cache só é gravado quando o arquivo inteiro é lido, num arquivo temporário renomeado ao final
+    writer = None
+    write_cache = use_cache and nrows is None and len(columns) == len(job_postings_schema)
+    temp_path = cache_path + ".tmp"
+    completed = False
+    try:
+        for chunk in chunks:
+            chunk = convert_job_postings(chunk)
+            if write_cache:
+                if writer is None:
+                    schema = csv_cache_schema(chunk)
+                    schema = schema.with_metadata({
+                        **(schema.metadata or {}),
+                        b"bigdata_source": json.dumps(csv_cache_key(path, csv_cache_hash)).encode()})
+                    writer = pq.ParquetWriter(temp_path, schema)
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield chunk
+        completed = True
+    finally:
+        if writer is not None:
+            writer.close()
+            if completed:
+                os.replace(temp_path, cache_path)
+                print(Fore.LIGHTGREEN_EX + f"Cache gravado em {cache_path}")
+            else:
+                os.remove(temp_path)
+
+
+def import_job_postings(path=file, chunksize=csv_chunksize, nrows=None, columns=csv_columns):
+    """
+    Stream the CSV into PostgreSQL and Cassandra chunk by chunk, keeping only one chunk in memory.
+    Returns a dict with the total rows read, the time spent on reading/conversion and on each backend,
+    and the resource usage sampled during each of those phases.
+    """
+    global text_index
+    timings = {"rows": 0, "read": 0.0, "postgres": None,
+               "cassandra": None, "text_index": 0.0}
+    text_index = InvertedIndex()
+    samplers = {"read": ResourceSampler(), "postgres": ResourceSampler(),
+                "cassandra": ResourceSampler()}
+
+    # Começar timer para conexão e criação da tabela no PostgreSQL
+    try:
+        with samplers["postgres"]:
+            psql_insert_start_time = time.perf_counter()
+            create_postgres_table()
+            psql_insert_time = time.perf_counter() - psql_insert_start_time
+    except Exception as e:
+        print(Fore.RED + f"Erro ao criar a tabela no PostgreSQL: {e}")
+        psql_insert_time = None
+
+    # Começar timer para conexão e criação de tabela no Cassandra
+    try:
+        with samplers["cassandra"]:
+            cassandra_create_start_time = time.perf_counter()
+            prepared_statements = create_cassandra_schema()
+            salary_stats_statement = create_salary_stats_table()
 
             # Calcular tempo decorrido desde o inicio
-            cassandra_create_time = time.time() - cassandra_create_start_time
+            cassandra_create_time = time.perf_counter() - cassandra_create_start_time
+
+        print(
+            Fore.GREEN + f"Keyspace e tabelas criados com sucesso no Cassandra. Tempo decorrido: {cassandra_create_time:.4f}s")
+        cassandra_insert_time = 0.0
+    except Exception as e:
+        print(Fore.RED + f"Erro ao criar keyspace ou tabela no Cassandra: {e}")
+        cassandra_insert_time = None
+
+    cassandra_failures = 0
+    salary_stats = {}
 
-            print(
-                Fore.GREEN + f"Keyspace e tabela criados com sucesso no Cassandra. Tempo decorrido: {cassandra_create_time:.4f}s")
+    # Inserção no Cassandra distribuída entre processos, cada um com a sua sessão
+    ingest_pool = None
+    worker_stats = defaultdict(lambda: [0, 0.0])
+    if cassandra_ingest_processes > 1 and cassandra_insert_time is not None:
+        # A criação dos processos e das suas sessões é medida à parte, como a criação do keyspace
+        start_time = time.perf_counter()
+        try:
+            ingest_pool = create_cassandra_ingest_pool()
+            timings["cassandra_workers_startup"] = time.perf_counter() - start_time
+            print(Fore.GREEN +
+                  f"{cassandra_ingest_processes} processos de inserção iniciados no Cassandra. "
+                  f"Tempo decorrido: {timings['cassandra_workers_startup']:.4f}s")
+        except Exception as e:
+            print(Fore.RED + f"Erro ao iniciar os processos de inserção no Cassandra: {e}")
+            cassandra_insert_time = None
 
-            ###################################### Importar dados para Cassandra ######################################
+    print(Fore.YELLOW + f"Lendo arquivo {path}")
+    chunks = read_job_postings(path, chunksize, nrows, columns)
+    while True:
+        # Ler e converter o próximo bloco uma única vez, reutilizando o resultado em ambos os bancos
+        # Os timers começam dentro do `with` para não somar o custo do amostrador aos tempos
+        try:
+            with samplers["read"]:
+                read_start_time = time.perf_counter()
+                chunk = next(chunks, None)
+                read_time = time.perf_counter() - read_start_time
+        except Exception as e:
+            print(Fore.RED + "Falha ao ler o arquivo CSV: " + str(e))
+            exit()
+        if chunk is None:
+            break
+        timings["read"] += read_time
+        timings["rows"] += len(chunk)
+
+        if psql_insert_time is not None:
             try:
-                # Começar timer para inserção de dados no Cassandra
-                cassandra_insert_start_time = time.time()
-
-                # Prepare the CQL statement
-                insert_statement = f"""
-                    INSERT INTO {table} (
-                        job_id,
-                        company_name,
-                        company_id,
-                        title,
-                        description,
-                        max_salary,
-                        med_salary,
-                        min_salary,
-                        pay_period,
-                        formatted_work_type,
-                        location,
-                        applies,
-                        original_listed_time,
-                        remote_allowed,
-                        views,
-                        job_posting_url,
-                        application_url,
-                        application_type,
-                        expiry,
-                        closed_time,
-                        formatted_experience_level,
-                        skills_desc,
-                        listed_time,
-                        posting_domain,
-                        sponsored,
-                        work_type,
-                        currency,
-                        compensation_type
-                    ) VALUES (
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?, 
-                        ?
-                    )
-                """
-
-                # Prepare the statement
-                prepared_statement = cassandra_session.prepare(
-                    insert_statement)
-
-                # Insert data
-                for _, row in job_postings.iterrows():
-                    cassandra_session.execute(prepared_statement, [
-                        safe_convert(row['job_id'], str),  # job_id
-                        safe_convert(row['company_name'], str),  # company_name
-                        safe_convert(row['company_id'], str),  # company_id
-                        safe_convert(row['title'], str),  # title
-                        safe_convert(row['description'], str),  # description
-                        safe_convert(row['max_salary'], float),  # max_salary
-                        safe_convert(row['med_salary'], float),  # med_salary
-                        safe_convert(row['min_salary'], float),  # min_salary
-                        safe_convert(row['pay_period'], str),  # pay_period
-                        # formatted_work_type
-                        safe_convert(row['formatted_work_type'], str),
-                        safe_convert(row['location'], str),  # location
-                        safe_convert(row['applies'], int),  # applies
-                        # original_listed_time
-                        safe_convert(row['original_listed_time'], str),
-                        safe_convert(row['remote_allowed'],
-                                     bool),  # remote_allowed
-                        safe_convert(row['views'], int),  # views
-                        safe_convert(row['job_posting_url'],
-                                     str),  # job_posting_url
-                        safe_convert(row['application_url'],
-                                     str),  # application_url
-                        safe_convert(row['application_type'],
-                                     str),  # application_type
-                        safe_convert(row['expiry'], str),  # expiry
-                        safe_convert(row['closed_time'], str),  # closed_time
-                        # formatted_experience_level
-                        safe_convert(row['formatted_experience_level'], str),
-                        safe_convert(row['skills_desc'], str),  # skills_desc
-                        safe_convert(row['listed_time'], str),  # listed_time
-                        safe_convert(row['posting_domain'],
-                                     str),  # posting_domain
-                        safe_convert(row['sponsored'], bool),  # sponsored
-                        safe_convert(row['work_type'], str),  # work_type
-                        safe_convert(row['currency'], str),  # currency
-                        safe_convert(row['compensation_type'],
-                                     str)  # compensation_type
-                    ])
-
-                # Calcular tempo decorrido desde o inicio
-                cassandra_insert_time = time.time() - cassandra_insert_start_time
-
-                print(
-                    Fore.GREEN + f"Dados importados para o Cassandra com sucesso. Tempo decorrido: {cassandra_insert_time:.4f}s")
+                with samplers["postgres"]:
+                    start_time = time.perf_counter()
+                    load_postgres_chunk(chunk)
+                    psql_insert_time += time.perf_counter() - start_time
             except Exception as e:
-                print(
-                    Fore.RED + f"Erro ao importar dados para o Cassandra: {e}")
+                print(Fore.RED + f"Erro ao importar dados para o PostgreSQL: {e}")
+                psql_insert_time = None
+
+        if cassandra_insert_time is not None:
+            try:
+                with samplers["cassandra"]:
+                    start_time = time.perf_counter()
+                    if ingest_pool is not None:
+                        for pid, rows, elapsed, failures in load_cassandra_chunk_parallel(ingest_pool, chunk):
+                            worker_stats[pid][0] += rows
+                            worker_stats[pid][1] += elapsed
+                            cassandra_failures += failures
+                    else:
+                        cassandra_failures += load_cassandra_chunk(
+                            prepared_statements, chunk)
+                    cassandra_failures += update_salary_stats(
+                        salary_stats_statement, salary_stats, chunk)
+                    cassandra_insert_time += time.perf_counter() - start_time
+            except Exception as e:
+                print(Fore.RED + f"Erro ao importar dados para o Cassandra: {e}")
+                cassandra_insert_time = None
+
+        if text_index_enabled:
+            start_time = time.perf_counter()
+            text_index.add_frame(chunk)
+            timings["text_index"] += time.perf_counter() - start_time
+
+        if chunksize is not None:
+            print(Fore.LIGHTGREEN_EX +
+                  f"{timings['rows']} linhas processadas")
+
+    if ingest_pool is not None:
+        ingest_pool.shutdown()
+
+    # No modo "staging", criar os índices depois da carga e trocar a tabela de carga pela final
+    if psql_insert_time is not None and postgres_load_mode == "staging":
+        timings["postgres_load"] = psql_insert_time
+        try:
+            with samplers["postgres"]:
+                start_time = time.perf_counter()
+                timings["postgres_index"], timings["postgres_swap"] = finish_postgres_staging_load()
+                psql_insert_time += time.perf_counter() - start_time
+        except Exception as e:
+            print(Fore.RED + f"Erro ao criar os índices ou trocar a tabela no PostgreSQL: {e}")
+            psql_insert_time = None
+
+    timings["resources"] = {phase: sampler.summary()
+                            for phase, sampler in samplers.items()}
+
+    print(Fore.LIGHTGREEN_EX +
+          f"{timings['rows']} linhas lidas com sucesso! Tempo de leitura e conversão: {timings['read']:.4f}s")
+    if timings["resources"]["read"]:
+        print(Fore.LIGHTGREEN_EX + format_resources(timings["resources"]["read"]))
+
+    if text_index_enabled:
+        print(Fore.LIGHTGREEN_EX +
+              f"Índice de texto construído com {len(text_index.postings)} termos. Tempo decorrido: {timings['text_index']:.4f}s")
+
+    if psql_insert_time is not None:
+        print(
+            Fore.GREEN + f"Dados importados para o PostgreSQL com sucesso. Tempo decorrido: {psql_insert_time:.4f}s")
+        if "postgres_index" in timings:
+            print(Fore.GREEN +
+                  f"Carga na tabela UNLOGGED: {timings['postgres_load']:.4f}s, "
+                  f"criação dos índices: {timings['postgres_index']:.4f}s, "
+                  f"troca das tabelas: {timings['postgres_swap']:.4f}s")
+        if timings["resources"]["postgres"]:
+            print(Fore.GREEN + format_resources(timings["resources"]["postgres"]))
+
+    if cassandra_failures:
+        print(
+            Fore.RED + f"{cassandra_failures} linhas falharam ao serem inseridas no Cassandra")
+    if cassandra_insert_time is not None:
+        print(
+            Fore.GREEN + f"Dados importados para o Cassandra com sucesso. Tempo decorrido: {cassandra_insert_time:.4f}s")
+        if timings["resources"]["cassandra"]:
+            print(Fore.GREEN + format_resources(timings["resources"]["cassandra"]))
+        if worker_stats:
+            timings["cassandra_workers"] = {
+                pid: {"rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed if elapsed else 0.0}
+                for pid, (rows, elapsed) in worker_stats.items()}
+            for pid, stats in timings["cassandra_workers"].items():
+                print(Fore.GREEN +
+                      f"Processo {pid}: {stats['rows']} linhas em {stats['seconds']:.4f}s ({stats['rows_per_second']:.0f} linhas/s)")
+            total_rows = sum(rows for rows, _ in worker_stats.values())
+            print(Fore.GREEN +
+                  f"Vazão total com {len(worker_stats)} processos: {total_rows / cassandra_insert_time:.0f} linhas/s")
+
+    timings["postgres"] = psql_insert_time
+    timings["cassandra"] = cassandra_insert_time
+    return timings
 
-except Exception as e:
-    print(Fore.RED + f"Erro ao criar keyspace ou tabela no Cassandra: {e}")
 
 ###################################### FUNÇÕES ##################################################
 # Funções para realizar as consultas e medir o tempo
 
 
+def numbered_placeholders(query, template):
+    """
+    Replace each ? placeholder of `query` with `template` formatted with its 1-based position.
+    """
+    positions = iter(range(1, query.count("?") + 1))
+    return re.sub(r"\?", lambda match: template.format(next(positions)), query)
+
+
+def postgres_statement(query, params=None):
+    """
+    SQLAlchemy text() for `query` and its bind parameters, turning ? placeholders into :p1, :p2, ...
+    """
+    if params is None:
+        return sqlalchemy.text(query), None
+    return (sqlalchemy.text(numbered_placeholders(query, ":p{}")),
+            {f"p{position}": value for position, value in enumerate(params, 1)})
+
+
+def postgres_execute_prepared(connection, query, params):
+    """
+    Run `query` (with ? placeholders) as a server-side prepared statement. The PREPARE is sent once per
+    database connection, tracked in connection.info, which lives as long as the pooled connection.
+    """
+    name = "stmt_" + hashlib.md5(query.encode()).hexdigest()[:16]
+    prepared = connection.info.setdefault("prepared_statements", set())
+    if name not in prepared:
+        connection.exec_driver_sql(f"PREPARE {name} AS {numbered_placeholders(query, '${}')}")
+        prepared.add(name)
+    return connection.exec_driver_sql(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", tuple(params))
+
+
+def postgres_batches(connection, query, params=None, fetch_size=postgres_fetch_size):
+    """
+    Run `query` through a server-side cursor and yield its rows in lists of at most `fetch_size`.
+    """
+    result = connection.execution_options(yield_per=fetch_size).execute(*postgres_statement(query, params))
+    yield from result.partitions()
+
+
 @measure_time
-def postgres_query(query):
+def postgres_query(query, params=None):
     try:
         with postgresql_engine.connect() as postgres_conn:
-            result = postgres_conn.execute(sqlalchemy.text(query))
-            if str(query).strip().upper().startswith("UPDATE"):
+            is_update = str(query).strip().upper().startswith("UPDATE")
+            if params is not None and prepared_statements_enabled:
+                # DECLARE CURSOR não aceita EXECUTE, então o resultado do comando preparado é lido de uma vez
+                result = postgres_execute_prepared(postgres_conn, query, params)
+            elif is_update or not postgres_stream_results:
+                # Cursores no servidor só aceitam SELECT, então o UPDATE é sempre executado diretamente
+                result = postgres_conn.execute(*postgres_statement(query, params))
+            else:
+                return StreamedResult(postgres_batches(postgres_conn, query, params))
+            if is_update:
                 postgres_conn.commit()
                 return [], 0  # No rows to return for UPDATE queries
             return result.fetchall()
@@ -291,34 +1529,381 @@ def postgres_query(query):
         return [], 0
 
 
+def cassandra_pages(session, query, parameters=None, fetch_size=cassandra_fetch_size):
+    """
+    Yield the rows of `query` page by page. The request for the next page is sent asynchronously before the
+    current page is yielded, so the server reads it while the caller processes the current one.
+    `fetch_size` applies to query strings; statements keep their own fetch_size.
+    """
+    if isinstance(query, str):
+        query = SimpleStatement(query, fetch_size=fetch_size)
+    future = session.execute_async(query, parameters)
+    while future is not None:
+        result = future.result()
+        future = None
+        if result.paging_state is not None:
+            future = session.execute_async(query, parameters, paging_state=result.paging_state)
+        yield result.current_rows
+
+
 @measure_time
-def cassandra_query(query):
+def cassandra_query(query, params=None):
     try:
-        with Cluster([cassandra_container_ip]) as cassandra_cluster:
-            with cassandra_cluster.connect() as cassandra_session:
-                cassandra_session.set_keyspace(keyspace)
-                return cassandra_session.execute(SimpleStatement(query)).all()
+        cassandra_session = get_cassandra_session()
+        if cassandra_session.keyspace != keyspace:
+            cassandra_session.set_keyspace(keyspace)
+        # Consultas resolvidas no cliente (ex: varredura paralela) são funções que retornam as linhas
+        if callable(query):
+            return query()
+        if prepared_statements_enabled:
+            statement = cassandra_prepare(cassandra_session, query)
+        else:
+            # Sem preparar, os parâmetros são formatados pelo driver no lugar de %s
+            statement = SimpleStatement(query.replace("?", "%s"), fetch_size=cassandra_fetch_size)
+        if cassandra_stream_results:
+            return StreamedResult(cassandra_pages(cassandra_session, statement, params))
+        return cassandra_session.execute(statement, params).all()
     except Exception as e:
         print(Fore.RED + f"Erro ao executar a consulta no Cassandra: {e}")
         return []
 
-# Função para medir o tempo das consultas
+# Funções para varrer tabelas inteiras do Cassandra em paralelo por faixas de token
+
+
+def token_ranges(splits=cassandra_scan_splits):
+    """
+    Split the Murmur3 token ring into `splits` contiguous (start, end] ranges covering every token.
+    """
+    min_token, max_token = -2 ** 63, 2 ** 63 - 1
+    step = (max_token - min_token) // splits
+    bounds = [min_token + step * index for index in range(splits)] + [max_token]
+    return list(zip(bounds[:-1], bounds[1:]))
+
 
+def cassandra_token_scan(callback, columns="*", table_name=table, partition_key=job_postings_key,
+                         splits=cassandra_scan_splits, workers=cassandra_scan_workers,
+                         fetch_size=cassandra_scan_fetch_size):
+    """
+    Read a whole table by querying `splits` token(partition_key) ranges in parallel from `workers` threads.
+    `callback` receives every page of rows as it arrives; it is called from the worker threads, so it
+    must be thread-safe. Returns the number of rows read.
+    """
+    cassandra_session = get_cassandra_session()
+    statement = cassandra_prepare(
+        cassandra_session,
+        f"SELECT {columns} FROM {table_name} "
+        f"WHERE token({partition_key}) > ? AND token({partition_key}) <= ?",
+        fetch_size)
+
+    def scan_range(token_range):
+        rows_read = 0
+        for page in cassandra_pages(cassandra_session, statement, token_range):
+            if page:
+                callback(page)
+                rows_read += len(page)
+        return rows_read
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(scan_range, token_ranges(splits)))
+
+
+def cassandra_scan_max(column):
+    """
+    MAX(column) over job_postings computed from a parallel token-range scan.
+    """
+    maxima = []
+
+    def on_rows(rows):
+        values = [getattr(row, column) for row in rows if getattr(row, column) is not None]
+        if values:
+            # list.append é atômico, então as threads podem compartilhar a lista
+            maxima.append(max(values))
+
+    cassandra_token_scan(on_rows, column)
+    return [(max(maxima) if maxima else None,)]
+
+
+def cassandra_scan_filter(column, value):
+    """
+    Rows of job_postings where `column` equals `value`, filtered on the client from a parallel token-range scan.
+    """
+    matches = []
 
-def run_and_print_results(label, query):
-    postgres_results, postgres_time = postgres_query(query)
+    def on_rows(rows):
+        matches.extend(row for row in rows if getattr(row, column) == value)
 
-    # Erro ao executar a consulta no Cassandra: Error from server: code=2200 [Invalid query] message="Cannot execute this query as it might involve data filtering and thus may have unpredictable performance. If you want to execute this query despite the performance unpredictability, use ALLOW FILTERING"
-    if (label == "Filtragem por índice secundário"):
-        query += " ALLOW FILTERING"
+    cassandra_token_scan(on_rows)
+    return matches
 
-    cassandra_results, cassandra_time = cassandra_query(query)
+# Agregação com agrupamento no cliente (o Cassandra não tem GROUP BY em colunas arbitrárias)
+
+
+class GroupedAggregator:
+    """
+    Grouped max/min/sum/count of a numeric column computed on the client from batches of
+    (group, value) rows. Each batch becomes two NumPy arrays reduced with vectorized ufuncs and is
+    merged into one partial result per group, so memory is bounded by the number of groups.
+    `add_rows` is thread-safe and can be used directly as a scan callback.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self._lock = threading.Lock()
+
+    def add_rows(self, rows):
+        if not rows:
+            return
+        keys, values = zip(*rows)
+        keys = np.array(keys, dtype=object)
+        values = np.array(values, dtype=float)  # None vira NaN
+        mask = ~np.isnan(values) & (keys != None)  # noqa: E711 (comparação elemento a elemento)
+        if not mask.any():
+            return
+
+        unique, inverse = np.unique(keys[mask], return_inverse=True)
+        values = values[mask]
+        counts = np.bincount(inverse, minlength=len(unique))
+        sums = np.bincount(inverse, weights=values, minlength=len(unique))
+        maxima = np.full(len(unique), -np.inf)
+        np.maximum.at(maxima, inverse, values)
+        minima = np.full(len(unique), np.inf)
+        np.minimum.at(minima, inverse, values)
+
+        with self._lock:
+            for index, key in enumerate(unique):
+                if key in self.groups:
+                    group = self.groups[key]
+                    group[0] = max(group[0], maxima[index])
+                    group[1] = min(group[1], minima[index])
+                    group[2] += sums[index]
+                    group[3] += counts[index]
+                else:
+                    self.groups[key] = [maxima[index], minima[index], sums[index], counts[index]]
+
+    def results(self):
+        """
+        Return (group, max, min, avg, count) tuples ordered by group.
+        """
+        return [(key, float(maximum), float(minimum), float(total / count), int(count))
+                for key, (maximum, minimum, total, count) in sorted(self.groups.items())]
+
+
+def cassandra_group_by(group_column, value_column, scan=None):
+    """
+    Grouped max/min/avg/count of `value_column` by `group_column` over job_postings, aggregated on the client
+    from a parallel token-range scan or a single paged query (`cassandra_group_by_scan`).
+    """
+    aggregator = GroupedAggregator()
+    columns = f"{group_column}, {value_column}"
+
+    if (scan or cassandra_group_by_scan) == "token_range":
+        cassandra_token_scan(aggregator.add_rows, columns)
+    else:
+        for page in cassandra_pages(get_cassandra_session(), f"SELECT {columns} FROM {table}",
+                                    fetch_size=cassandra_scan_fetch_size):
+            aggregator.add_rows(page)
+
+    return aggregator.results()
+
+# Função para medir o tempo das consultas
+
+
+def run_and_print_results(label, query, cassandra_query_text=None, params=None):
+    with ResourceSampler() as postgres_sampler:
+        postgres_results, postgres_stats = benchmark(postgres_query, query, params)
+    postgres_stats["resources"] = postgres_sampler.summary()
+
+    # Consultas que no Cassandra exigiriam ALLOW FILTERING são direcionadas a uma tabela de consulta
+    with ResourceSampler() as cassandra_sampler:
+        cassandra_results, cassandra_stats = benchmark(
+            cassandra_query, cassandra_query_text or query, params)
+    cassandra_stats["resources"] = cassandra_sampler.summary()
 
     print(Fore.YELLOW + f"\n{label}")
     print(Fore.CYAN +
-          f"PostgreSQL - Tempo: {postgres_time:.4f}s, Resultados: {len(postgres_results)}")
+          f"PostgreSQL - {format_timings(postgres_stats)}, Resultados: {len(postgres_results)}")
+    if "first_batch" in postgres_stats:
+        print(Fore.CYAN + format_batches(postgres_stats))
+    if postgres_stats["resources"]:
+        print(Fore.CYAN + format_resources(postgres_stats["resources"]))
     print(Fore.MAGENTA +
-          f"Cassandra - Tempo: {cassandra_time:.4f}s, Resultados: {len(cassandra_results)}")
+          f"Cassandra - {format_timings(cassandra_stats)}, Resultados: {len(cassandra_results)}")
+    if "first_batch" in cassandra_stats:
+        print(Fore.MAGENTA + format_batches(cassandra_stats))
+    if cassandra_stats["resources"]:
+        print(Fore.MAGENTA + format_resources(cassandra_stats["resources"]))
+
+    return {"postgres": postgres_stats, "cassandra": cassandra_stats}
+
+
+# Funções para o teste de carga com vários clientes simultâneos
+
+
+def load_test(query_func, workload, workers, duration=load_test_duration):
+    """
+    Issue the `workload` (query, params) pairs round-robin from `workers` threads for `duration` seconds.
+    `query_func` is a @measure_time decorated function. Returns the latency summary plus the
+    number of operations and the sustained operations per second.
+    """
+    latencies = [[] for _ in range(workers)]
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        samples = latencies[index]
+        position = index
+        while time.perf_counter() < deadline:
+            _, elapsed = query_func(*workload[position % len(workload)])
+            samples.append(elapsed)
+            position += 1
+
+    threads = [threading.Thread(target=worker, args=(index,))
+               for index in range(workers)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    samples = [sample for worker_samples in latencies for sample in worker_samples]
+    stats = summarize_timings(samples)
+    stats["operations"] = len(samples)
+    stats["ops_per_second"] = len(samples) / elapsed
+    return stats
+
+
+def run_load_tests(levels=load_test_concurrency_levels, duration=load_test_duration):
+    """
+    Run the `queries` workload against both backends at each concurrency level and print the results.
+    Returns {backend: {workers: stats}}.
+    """
+    workloads = {
+        "postgres": (postgres_query, [(query['query'], query.get('params')) for query in queries]),
+        "cassandra": (cassandra_query, [(query.get('cassandra_query') or query['query'], query.get('params'))
+                                        for query in queries]),
+    }
+    colors = {"postgres": Fore.CYAN, "cassandra": Fore.MAGENTA}
+    names = {"postgres": "PostgreSQL", "cassandra": "Cassandra"}
+
+    print(Fore.YELLOW + f"\nTeste de carga ({duration}s por nível de concorrência)")
+    results = {}
+    for backend, (query_func, workload) in workloads.items():
+        results[backend] = {}
+        for workers in levels:
+            stats = load_test(query_func, workload, workers, duration)
+            results[backend][workers] = stats
+            print(colors[backend] +
+                  f"{names[backend]} - {workers} clientes: {stats['ops_per_second']:.1f} op/s, "
+                  f"Mediana: {stats['median']:.4f}s, p95: {stats['p95']:.4f}s, p99: {stats['p99']:.4f}s "
+                  f"({stats['operations']} operações)")
+    return results
+
+
+# Funções para a varredura de escala
+
+
+def run_queries():
+    """
+    Benchmark every query in `queries` on both backends. With postgres_text_indexes_enabled, the text
+    search queries are run again after building the PostgreSQL text indexes.
+    Returns {description: {backend: stats}}.
+    """
+    results = {
+        query['description']: run_and_print_results(query['description'],
+                                                     query['query'],
+                                                     query.get('cassandra_query'),
+                                                     query.get('params'))
+        for query in queries
+    }
+
+    if postgres_text_indexes_enabled:
+        index_start_time = time.perf_counter()
+        try:
+            create_postgres_text_indexes()
+        except Exception as e:
+            print(Fore.RED + f"Erro ao criar os índices de texto no PostgreSQL: {e}")
+            return results
+        index_time = time.perf_counter() - index_start_time
+        print(Fore.GREEN +
+              f"\nÍndices de texto criados no PostgreSQL. Tempo decorrido: {index_time:.4f}s")
+
+        for query in queries:
+            if query.get('text'):
+                label = f"{query['description']} - com índices de texto no PostgreSQL"
+                results[label] = run_and_print_results(label,
+                                                       query['query'],
+                                                       query.get('cassandra_query'),
+                                                       query.get('params'))
+    return results
+
+
+def plot_scale_sweep(results, directory=results_dir):
+    """
+    Save the insert-time chart and one mean-query-time chart per query for the scale sweep results.
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print(Fore.RED + "matplotlib não está instalado, gráficos da varredura não foram gerados")
+        return
+
+    sizes = [result["rows"] for result in results]
+    backends = {"postgres": "PostgreSQL", "cassandra": "Cassandra"}
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for backend, name in backends.items():
+        # Bancos que falharam na importação ficam sem ponto no gráfico
+        ax.plot(sizes, [np.nan if result["insert"][backend] is None else result["insert"][backend]
+                        for result in results], marker="o", label=name)
+    ax.set_xscale("log")
+    ax.set_xlabel("Linhas")
+    ax.set_ylabel("Tempo de inserção (s)")
+    ax.set_title("Tempo de inserção")
+    ax.legend()
+    fig.savefig(os.path.join(directory, "scale_sweep_insert.png"), bbox_inches="tight")
+    plt.close(fig)
+
+    descriptions = list(results[0]["queries"])
+    fig, axes = plt.subplots(len(descriptions), 1, figsize=(8, 4 * len(descriptions)), squeeze=False)
+    for ax, description in zip(axes[:, 0], descriptions):
+        for backend, name in backends.items():
+            ax.plot(sizes, [result["queries"][description][backend]["mean"] for result in results],
+                    marker="o", label=name)
+        ax.set_xscale("log")
+        ax.set_xlabel("Linhas")
+        ax.set_ylabel("Tempo médio (s)")
+        ax.set_title(description)
+        ax.legend()
+    fig.savefig(os.path.join(directory, "scale_sweep_queries.png"), bbox_inches="tight")
+    plt.close(fig)
+
+
+def run_scale_sweep(sizes=scale_sweep_sizes, directory=results_dir):
+    """
+    Import the first N rows of the dataset and benchmark the queries for each N in `sizes`, then write
+    the results to scale_sweep.json and the comparison charts to `directory`.
+    """
+    results = []
+    for size in sizes:
+        print(Fore.YELLOW + f"\n########## Varredura de escala: {size} linhas ##########")
+        timings = import_job_postings(nrows=size)
+        results.append({
+            "rows": timings["rows"],
+            "insert": {"postgres": timings["postgres"], "cassandra": timings["cassandra"]},
+            "read": timings["read"],
+            "queries": run_queries(),
+        })
+
+    os.makedirs(directory, exist_ok=True)
+    results_file = os.path.join(directory, "scale_sweep.json")
+    with open(results_file, "w") as f:
+        json.dump(results, f, indent=2)
+    print(Fore.GREEN + f"\nResultados da varredura gravados em {results_file}")
+
+    plot_scale_sweep(results, directory)
+    return results
 
 
 # Consultas
@@ -326,21 +1911,89 @@ queries = [
     {
         "description": "Função agregada - Salário máximo",
         "query": f"SELECT MAX(max_salary) FROM {table}",
+        "cassandra_query": (f"SELECT max_value FROM {salary_stats_table} WHERE scope = 'overall' AND group_key = 'all'"
+                            if cassandra_use_salary_stats else None),
+    },
+    {
+        "description": "Função agregada - Salário por período de pagamento",
+        "query": (f"SELECT pay_period, MAX(max_salary), MIN(max_salary), SUM(max_salary), COUNT(max_salary) "
+                  f"FROM {table} WHERE pay_period IS NOT NULL AND max_salary IS NOT NULL GROUP BY pay_period"),
+        "cassandra_query": f"SELECT * FROM {salary_stats_table} WHERE scope = 'pay_period'",
     },
     {
         "description": "Leitura simples por chave primária",
-        "query": f"SELECT * FROM {table} WHERE job_id = '2147609816'",
+        "query": f"SELECT * FROM {table} WHERE job_id = ?",
+        "params": ("2147609816",),
     },
     {
         "description": "Atualização por chave primária",
-        "query": f"UPDATE {table} SET title = 'Updated Job' WHERE job_id = '2974397965'",
+        "query": f"UPDATE {table} SET title = ? WHERE job_id = ?",
+        "params": ("Updated Job", "2974397965"),
     },
     {
         "description": "Filtragem por índice secundário",
         "query": f"SELECT * FROM {table} WHERE formatted_work_type = 'Full-time'",
+        "cassandra_query": f"SELECT * FROM {table}_by_work_type WHERE formatted_work_type = 'Full-time'",
+    },
+    {
+        "description": "Função agregada - Salário máximo (varredura paralela no Cassandra)",
+        "query": f"SELECT MAX(max_salary) FROM {table}",
+        "cassandra_query": functools.partial(cassandra_scan_max, "max_salary"),
+    },
+    {
+        "description": "Filtragem por tipo de trabalho (varredura paralela no Cassandra)",
+        "query": f"SELECT * FROM {table} WHERE formatted_work_type = 'Full-time'",
+        "cassandra_query": functools.partial(cassandra_scan_filter, "formatted_work_type", "Full-time"),
+    },
+    {
+        "description": "Agrupamento - Salário por nível de experiência (agregação no cliente no Cassandra)",
+        "query": (f"SELECT formatted_experience_level, MAX(max_salary), MIN(max_salary), AVG(max_salary), COUNT(max_salary) "
+                  f"FROM {table} WHERE formatted_experience_level IS NOT NULL AND max_salary IS NOT NULL "
+                  f"GROUP BY formatted_experience_level ORDER BY formatted_experience_level"),
+        "cassandra_query": functools.partial(cassandra_group_by, "formatted_experience_level", "max_salary"),
+    },
+    {
+        "description": "Agrupamento - Salário por localização (agregação no cliente no Cassandra)",
+        "query": (f"SELECT location, MAX(max_salary), MIN(max_salary), AVG(max_salary), COUNT(max_salary) "
+                  f"FROM {table} WHERE location IS NOT NULL AND max_salary IS NOT NULL "
+                  f"GROUP BY location ORDER BY location"),
+        "cassandra_query": functools.partial(cassandra_group_by, "location", "max_salary"),
+    },
+    {
+        "description": "Busca de texto - Termo 'engineer' (índice invertido local no Cassandra)",
+        "query": f"SELECT * FROM {table} WHERE {postgres_word_filter('engineer')}",
+        "cassandra_query": functools.partial(cassandra_text_search, "engineer"),
+        "text": True,
+    },
+    {
+        "description": "Busca de texto - Frase 'software engineer' (índice invertido local no Cassandra)",
+        "query": f"SELECT * FROM {table} WHERE {postgres_word_filter('software engineer')}",
+        "cassandra_query": functools.partial(cassandra_text_search, "software engineer", phrase=True),
+        "text": True,
+    },
+    {
+        "description": "Busca de texto completo - Termo 'engineer' (@@ no PostgreSQL)",
+        "query": f"SELECT * FROM {table} WHERE {postgres_text_vector} @@ plainto_tsquery('{postgres_text_search_config}', 'engineer')",
+        "cassandra_query": functools.partial(cassandra_text_search, "engineer"),
+        "text": True,
+    },
+    {
+        "description": "Busca de texto completo - Frase 'software engineer' (@@ no PostgreSQL)",
+        "query": f"SELECT * FROM {table} WHERE {postgres_text_vector} @@ phraseto_tsquery('{postgres_text_search_config}', 'software engineer')",
+        "cassandra_query": functools.partial(cassandra_text_search, "software engineer", phrase=True),
+        "text": True,
     }
 ]
 
-for query in queries:
-    run_and_print_results(query['description'],
-                          query['query'])
+if __name__ == "__main__":
+    if scale_sweep_sizes:
+        run_scale_sweep()
+    else:
+        import_job_postings()
+        run_queries()
+
+        if load_test_enabled:
+            run_load_tests()
+
+    # Fechar a conexão com o Cassandra
+    close_cassandra_session()